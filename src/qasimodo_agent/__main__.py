@@ -8,6 +8,8 @@ import logging
 import os
 import signal
 import sys
+from collections import deque
+from collections.abc import Callable
 from dataclasses import dataclass, field
 from datetime import datetime, timedelta, timezone
 from typing import Any
@@ -20,8 +22,15 @@ except ImportError:
     termios = None  # type: ignore
     tty = None  # type: ignore
 
+# Optional libuv-based event loop (not available on Windows)
+try:
+    import uvloop
+except ImportError:
+    uvloop = None  # type: ignore
+
 import nats
-from rich.console import Console
+from google.protobuf.message import DecodeError
+from rich.console import Console, ConsoleDimensions
 from rich.live import Live
 from rich.panel import Panel
 from rich.table import Table
@@ -34,6 +43,11 @@ from qasimodo_agent.state import clear_core_token, get_core_token, is_core_token
 
 LOGGER = logging.getLogger("qasimodo.agent")
 console = Console()
+# The logs panel shows this many lines; older entries are never read, so they are not kept.
+TUI_LOG_LINES = 10
+
+# Last panel built by render_tui and the displayed values it was built from.
+_RENDER_CACHE: tuple[tuple[Any, ...], Panel] | None = None
 
 
 def health_check() -> bool:
@@ -66,7 +80,7 @@ class AgentState:
     status: str = "disconnected"
     version: str = ""
     last_heartbeat: datetime | None = None
-    logs: list[str] = field(default_factory=list)
+    logs: deque[str] = field(default_factory=lambda: deque(maxlen=TUI_LOG_LINES))
     auth_url: str | None = None
     authenticated: bool = False
 
@@ -146,6 +160,9 @@ class AgentController:
         self.control_task: asyncio.Task | None = None
         self.logout_event: asyncio.Event = asyncio.Event()
         self.token_future: asyncio.Future[str] | None = None
+        # Newest heartbeat not yet shown. Only the latest matters, so heartbeats overwrite this slot
+        # instead of queueing, and are parsed once per drain rather than once per message.
+        self.latest_heartbeat: bytes | None = None
 
     async def ensure_control_listener(self, *, agent_id: str, nats_url: str) -> None:
         if self.control_task:
@@ -181,8 +198,8 @@ class AgentController:
         async def _runner() -> None:
             assert self.control_nc is not None
             await self.control_nc.subscribe(subject, cb=_on_control)
-            while True:
-                await asyncio.sleep(1)
+            # Callbacks run on the NATS client; park here until shutdown cancels the task.
+            await asyncio.Event().wait()
 
         self.control_task = asyncio.create_task(_runner())
 
@@ -204,19 +221,7 @@ class AgentController:
         result_subject = f"agents.{agent_id}.results"
 
         async def _on_heartbeat(msg: nats.aio.msg.Msg) -> None:
-            heartbeat = AgentHeartbeat()
-            heartbeat.ParseFromString(msg.data)
-            await self.event_queue.put(
-                AgentEvent(
-                    kind="heartbeat",
-                    payload={
-                        "agent_id": heartbeat.metadata.agent_id,
-                        "timestamp": heartbeat.timestamp,
-                        "version": heartbeat.metadata.agent_version,
-                        "status": heartbeat.status,
-                    },
-                )
-            )
+            self.latest_heartbeat = msg.data
 
         async def _on_result(msg: nats.aio.msg.Msg) -> None:
             result = AgentResult()
@@ -246,8 +251,8 @@ class AgentController:
             assert self.monitor_nc is not None
             await self.monitor_nc.subscribe(heartbeat_subject, cb=_on_heartbeat)
             await self.monitor_nc.subscribe(result_subject, cb=_on_result)
-            while True:
-                await asyncio.sleep(1)
+            # Callbacks run on the NATS client; park here until stop() cancels the task.
+            await asyncio.Event().wait()
 
         self.monitor_task = asyncio.create_task(_monitor())
 
@@ -275,6 +280,8 @@ class AgentController:
         self.stop_event = None
         self.monitor_task = None
         self.monitor_nc = None
+        # A heartbeat left over from the stopped runtime must not mark the agent online again.
+        self.latest_heartbeat = None
         if had_runtime:
             await self.event_queue.put(AgentEvent(kind="log", payload={"message": "Agent stopped"}))
             await self.event_queue.put(
@@ -299,11 +306,16 @@ class AgentController:
 
 
 def render_tui(state: AgentState) -> Panel:
+    global _RENDER_CACHE
     status = "online"
     if state.last_heartbeat is None or (datetime.now(timezone.utc) - state.last_heartbeat) > timedelta(minutes=5):
         status = "offline"
     if state.status.lower() == "disconnected":
         status = "disconnected"
+    # The loop re-renders several times a second; rebuild the Rich tree only when something visible changed.
+    key = (state.agent_id, state.version, state.nats_url, status, state.last_heartbeat, tuple(state.logs))
+    if _RENDER_CACHE is not None and _RENDER_CACHE[0] == key:
+        return _RENDER_CACHE[1]
 
     agent_table = Table.grid(padding=(0, 1))
     agent_table.add_column(justify="left")
@@ -322,8 +334,8 @@ def render_tui(state: AgentState) -> Panel:
     if state.last_heartbeat:
         agent_table.add_row("Last heartbeat", state.last_heartbeat.isoformat())
 
-    logs = state.logs[-10:] or ["Waiting for events…"]
-    while len(logs) < 10:
+    logs = list(state.logs) or ["Waiting for events…"]
+    while len(logs) < TUI_LOG_LINES:
         logs.append("")
     logs_panel = Panel("\n".join(logs), title="Logs", border_style="magenta", height=12)
 
@@ -331,38 +343,70 @@ def render_tui(state: AgentState) -> Panel:
     body.add_row(Panel(agent_table, title="Agent", border_style="yellow"))
     body.add_row(logs_panel)
 
-    return Panel(body, border_style="white")
+    panel = Panel(body, border_style="white")
+    _RENDER_CACHE = (key, panel)
+    return panel
+
+
+def _on_log_event(state: AgentState, event: AgentEvent, now_iso: str) -> None:
+    state.logs.append(f"{now_iso} {event.payload.get('message', '')}")
+
+
+def _apply_heartbeat(state: AgentState, data: bytes) -> None:
+    if not state.authenticated:
+        return
+    heartbeat = AgentHeartbeat()
+    try:
+        heartbeat.ParseFromString(data)
+    except DecodeError as exc:
+        # Parsed on the UI loop now, so a bad payload is dropped here rather than taking the loop down.
+        LOGGER.warning("Ignoring malformed heartbeat: %s", exc)
+        return
+    ts = datetime.fromtimestamp(heartbeat.timestamp, tz=timezone.utc)
+    state.last_heartbeat = ts
+    state.version = heartbeat.metadata.agent_version
+    state.status = heartbeat.status
+    state.logs.append(f"{ts.isoformat()} heartbeat v{state.version}")
+
+
+def _on_status_event(state: AgentState, event: AgentEvent, now_iso: str) -> None:
+    status = event.payload.get("status", "offline")
+    ts_raw = event.payload.get("timestamp")
+    ts = datetime.fromtimestamp(ts_raw, tz=timezone.utc).isoformat() if ts_raw else now_iso
+    state.status = status
+    state.last_heartbeat = None
+    state.logs.append(f"{ts} agent status: {status}")
+
+
+def _on_result_event(state: AgentState, event: AgentEvent, now_iso: str) -> None:
+    run_id = event.payload.get("run_id") or "unknown"
+    state.logs.append(f"{now_iso} result {run_id} {event.payload.get('status', '')} {event.payload.get('message', '')}")
+
+
+_EVENT_HANDLERS: dict[str, Callable[[AgentState, AgentEvent, str], None]] = {
+    "log": _on_log_event,
+    "status": _on_status_event,
+    "result": _on_result_event,
+}
 
 
 async def drain_events(controller: AgentController, state: AgentState) -> None:
-    while not controller.event_queue.empty():
-        event = await controller.event_queue.get()
-        if event.kind == "log":
-            state.logs.append(f"{datetime.now(timezone.utc).isoformat()} {event.payload.get('message', '')}")
-        elif event.kind == "heartbeat":
-            if not state.authenticated:
-                continue
-            ts = datetime.fromtimestamp(event.payload["timestamp"], tz=timezone.utc)
-            state.last_heartbeat = ts
-            state.version = event.payload.get("version", state.version)
-            state.status = event.payload.get("status", state.status)
-            state.logs.append(f"{ts.isoformat()} heartbeat v{state.version}")
-        elif event.kind == "status":
-            status = event.payload.get("status", "offline")
-            ts_raw = event.payload.get("timestamp")
-            ts = (
-                datetime.fromtimestamp(ts_raw, tz=timezone.utc).isoformat()
-                if ts_raw
-                else datetime.now(timezone.utc).isoformat()
-            )
-            state.status = status
-            state.last_heartbeat = None
-            state.logs.append(f"{ts} agent status: {status}")
-        elif event.kind == "result":
-            run_id = event.payload.get("run_id") or "unknown"
-            state.logs.append(
-                f"{datetime.now(timezone.utc).isoformat()} result {run_id} {event.payload.get('status', '')} {event.payload.get('message', '')}"
-            )
+    queue = controller.event_queue
+    heartbeat_data, controller.latest_heartbeat = controller.latest_heartbeat, None
+    if queue.empty() and heartbeat_data is None:
+        return
+    # Everything already queued is handled in one pass without yielding, stamped with one clock read.
+    now_iso = datetime.now(timezone.utc).isoformat()
+    while True:
+        try:
+            event = queue.get_nowait()
+        except asyncio.QueueEmpty:
+            break
+        handler = _EVENT_HANDLERS.get(event.kind)
+        if handler is not None:
+            handler(state, event, now_iso)
+    if heartbeat_data is not None:
+        _apply_heartbeat(state, heartbeat_data)
 
 
 async def run_tui(
@@ -402,10 +446,20 @@ async def run_tui(
     except Exception:  # noqa: BLE001
         pass
 
-    with Live(render_tui(state), refresh_per_second=4, console=console, screen=True) as live:
+    # Repaint only when the panel or terminal size changed, instead of a fixed-rate refresh thread.
+    with Live(render_tui(state), auto_refresh=False, console=console, screen=True) as live:
+        shown: tuple[Panel, ConsoleDimensions] | None = None
+
+        def refresh() -> None:
+            nonlocal shown
+            current = (render_tui(state), console.size)
+            if shown is None or current[0] is not shown[0] or current[1] != shown[1]:
+                shown = current
+                live.update(current[0], refresh=True)
+
         while not quit_event.is_set() and not shutdown_event.is_set():
             await drain_events(controller, state)
-            live.update(render_tui(state))
+            refresh()
             # Re-auth if needed
             token = _get_valid_cached_token(state.agent_id)
             if not token:
@@ -413,7 +467,7 @@ async def run_tui(
                 _record_auth_prompt(state)
                 state.status = "offline"
                 state.last_heartbeat = None
-                live.update(render_tui(state))
+                refresh()
                 await controller.stop()
                 token_result = await _wait_for_core_token(
                     controller, state.agent_id, state.nats_url, state, cancel_event=cancel_event
@@ -434,7 +488,7 @@ async def run_tui(
                 state.last_heartbeat = None
                 state.logs.append(f"{datetime.now(timezone.utc).isoformat()} Agent set offline after logout")
                 _record_auth_prompt(state)
-                live.update(render_tui(state))
+                refresh()
                 continue
 
             await asyncio.sleep(0.25)
@@ -520,11 +574,31 @@ def parse_args() -> argparse.Namespace:
         choices=["true", "false"],
         help="Enable Chromium sandbox (default true; env QASIMODO_AGENT_CHROMIUM_SANDBOX)",
     )
+    parser.add_argument(
+        "--reuse-browser",
+        choices=["true", "false"],
+        help="Keep one Chromium instance alive across tasks (default false; env QASIMODO_AGENT_REUSE_BROWSER)",
+    )
     parser.add_argument(
         "--max-steps",
         type=int,
         help="Maximum browser steps per task (default 60; env QASIMODO_AGENT_MAX_STEPS)",
     )
+    parser.add_argument(
+        "--max-concurrent-tasks",
+        type=int,
+        help="Tasks fetched and run in parallel (default 1; env QASIMODO_AGENT_MAX_CONCURRENT_TASKS)",
+    )
+    parser.add_argument(
+        "--send-screenshots",
+        choices=["true", "false"],
+        help="Attach step screenshots to published results (default true; env QASIMODO_AGENT_SEND_SCREENSHOTS)",
+    )
+    parser.add_argument(
+        "--compress-screenshots",
+        choices=["true", "false"],
+        help="Re-encode step screenshots as lossy WebP (default false; env QASIMODO_AGENT_COMPRESS_SCREENSHOTS)",
+    )
     parser.add_argument(
         "--logout",
         action="store_true",
@@ -580,7 +654,10 @@ def cli() -> None:
     config = AgentConfig.from_args(args)
     try:
         llm_config = LLMConfig.from_args(args)
-        asyncio.run(_async_main(config, args.mode, llm_config, args.logout))
+        asyncio.run(
+            _async_main(config, args.mode, llm_config, args.logout),
+            loop_factory=uvloop.new_event_loop if uvloop is not None else None,
+        )
     except KeyboardInterrupt:
         pass
 
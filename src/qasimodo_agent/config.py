@@ -42,7 +42,11 @@ class AgentConfig:
     durable_prefix: str = "agent"
     browser_headless: bool = True
     chromium_sandbox: bool = True
+    reuse_browser: bool = False
     max_steps: int = 60
+    max_concurrent_tasks: int = 1
+    send_screenshots: bool = True
+    compress_screenshots: bool = False
     version: str = "dev"
 
     @property
@@ -72,7 +76,19 @@ class AgentConfig:
             browser_headless = args.browser_headless.lower() == "true"
         if args.chromium_sandbox:
             chromium_sandbox = args.chromium_sandbox.lower() == "true"
+        reuse_browser = _env_bool("QASIMODO_AGENT_REUSE_BROWSER", False)
+        if args.reuse_browser:
+            reuse_browser = args.reuse_browser.lower() == "true"
         max_steps = int(args.max_steps or os.environ.get("QASIMODO_AGENT_MAX_STEPS", "60"))
+        max_concurrent_tasks = int(
+            args.max_concurrent_tasks or os.environ.get("QASIMODO_AGENT_MAX_CONCURRENT_TASKS", "1")
+        )
+        send_screenshots = _env_bool("QASIMODO_AGENT_SEND_SCREENSHOTS", True)
+        if args.send_screenshots:
+            send_screenshots = args.send_screenshots.lower() == "true"
+        compress_screenshots = _env_bool("QASIMODO_AGENT_COMPRESS_SCREENSHOTS", False)
+        if args.compress_screenshots:
+            compress_screenshots = args.compress_screenshots.lower() == "true"
         version = get_agent_version()
         return cls(
             agent_id=agent_id,
@@ -80,7 +96,11 @@ class AgentConfig:
             heartbeat_interval=heartbeat_interval,
             browser_headless=browser_headless,
             chromium_sandbox=chromium_sandbox,
+            reuse_browser=reuse_browser,
             max_steps=max_steps,
+            max_concurrent_tasks=max_concurrent_tasks,
+            send_screenshots=send_screenshots,
+            compress_screenshots=compress_screenshots,
             version=version,
         )
 
@@ -2,8 +2,16 @@
 
 from __future__ import annotations
 
+import logging
+
+from google.protobuf.internal import api_implementation
 from qasimodo_specs.proto import agent_pb2 as _agent_pb2
 
+if api_implementation.Type() == "python":
+    logging.getLogger("qasimodo.agent.proto").warning(
+        "protobuf is using the pure-Python backend; install protobuf>=5.28 wheels for the upb accelerator"
+    )
+
 AgentMetadata = _agent_pb2.AgentMetadata
 AgentTask = _agent_pb2.AgentTask
 AgentStepResult = _agent_pb2.AgentStepResult
@@ -2,20 +2,37 @@ from __future__ import annotations
 
 import asyncio
 import contextlib
+import functools
+import io
 import json
 import logging
 import math
 import mimetypes
+import os
+import threading
+import time
+from collections import Counter
 from contextlib import suppress
+from dataclasses import dataclass, field
 from datetime import datetime, timezone
 from pathlib import Path
 from typing import Any
 
 import nats
+import orjson
 from browser_use import Agent as BrowserUseAgent
 from browser_use import Browser, ChatOpenAI
 from google.protobuf.message import DecodeError
+from nats.aio.msg import Msg
 from nats.errors import DrainTimeoutError
+from openai import DefaultAsyncHttpxClient
+
+# Pillow ships with browser-use; without it (or without libwebp) screenshots are sent as captured.
+try:
+    from PIL import Image, features
+except ImportError:
+    Image = None  # type: ignore
+    features = None  # type: ignore
 
 from qasimodo_agent.config import AgentConfig, LLMConfig
 from qasimodo_agent.browser import find_cached_chromium, ensure_chromium_installed, find_bundled_chromium
@@ -31,6 +48,63 @@ from qasimodo_agent.state import remember_project_agent
 
 LOGGER = logging.getLogger("qasimodo.agent.runtime")
 
+# Step partials in flight beyond this are shed; terminal results are never dropped.
+STEP_PUBLISH_HIGH_WATERMARK = 8
+# Headroom kept under the server max_payload for metadata, status text and timestamps.
+RESULT_ENVELOPE_BYTES = 1024
+WEBP_QUALITY = 82
+# Protobuf payloads above this are parsed/serialized on a worker thread to keep the loop responsive.
+PROTO_OFFLOAD_BYTES = 64 * 1024
+_WEBP_SUPPORTED = features is not None and bool(features.check("webp"))
+# Per-thread encode buffer reused by _compress_image_bytes across screenshots.
+_SCRATCH = threading.local()
+# Long-poll window for task fetches; JetStream answers as soon as a task arrives. Kept short because the
+# server-side pull request outlives a fetch cancelled on shutdown until it expires.
+TASK_FETCH_TIMEOUT = 5.0
+
+_LIST_HISTORY_KEYS = (
+    "urls",
+    "screenshots",
+    "action_names",
+    "extracted_content",
+    "errors",
+    "model_actions",
+    "model_outputs",
+    "model_thoughts",
+    "action_results",
+    "action_history",
+)
+# Fields browser-use derives from the last history entry only.
+_LAST_ENTRY_HISTORY_KEYS = ("final_result", "is_done", "is_successful", "structured_output")
+# Scalars kept when a history is too large to publish in full.
+_HISTORY_SUMMARY_KEYS = (
+    "number_of_steps",
+    "duration_seconds",
+    "is_done",
+    "is_successful",
+    "has_errors",
+    "final_result",
+)
+
+
+@functools.lru_cache(maxsize=32)
+def _mime_for_suffix(suffix: str) -> str:
+    mime_type, _ = mimetypes.guess_type(f"screenshot{suffix}")
+    return mime_type or "image/png"
+
+
+def _guess_mime_type(path: str) -> str:
+    # Screenshot paths are unique per step, so memoize on the extension rather than the path.
+    return _mime_for_suffix(os.path.splitext(path)[1].lower())
+
+
+@dataclass(slots=True)
+class _PartialHistory:
+    """History snapshot for an in-flight run, extended one step at a time."""
+
+    snapshot: dict[str, Any] = field(default_factory=dict)
+    steps_seen: int = 0
+
 
 class AgentRuntime:
     def __init__(self, config: AgentConfig, llm_config: LLMConfig) -> None:
@@ -39,12 +113,24 @@ class AgentRuntime:
         self._nc: nats.NATS | None = None
         self._js = None
         self._heartbeat_task: asyncio.Task[None] | None = None
+        self._heartbeat_publish: asyncio.Future[Any] | None = None
+        self._pending_publishes: set[asyncio.Future[Any]] = set()
+        self._dropped_steps: Counter[str] = Counter()
+        self._chromium_path: str | None = None
+        self._browser: Browser | None = None
+        self._http_client: DefaultAsyncHttpxClient | None = None
+        # Agent-level identity shared by every result and heartbeat; per-run ids are merged in on top.
+        self._metadata_template = AgentMetadata(agent_id=config.agent_id, agent_version=config.version)
 
     async def start(self, stop_event: asyncio.Event) -> None:
         LOGGER.info("Connecting to NATS at %s", self.config.nats_url)
         self._nc = await nats.connect(self.config.nats_url)
         self._js = self._nc.jetstream()
         await self._ensure_stream()
+        try:
+            await self._resolve_chromium_path()
+        except RuntimeError as exc:
+            LOGGER.warning("%s", exc)
         self._heartbeat_task = asyncio.create_task(self._heartbeat_loop(stop_event))
         try:
             await self._consume_tasks(stop_event)
@@ -53,6 +139,13 @@ class AgentRuntime:
                 self._heartbeat_task.cancel()
                 with contextlib.suppress(asyncio.CancelledError):
                     await self._heartbeat_task
+            await self._flush_pending_publishes()
+            browser, self._browser = self._browser, None
+            if browser is not None:
+                await self._close_browser(browser)
+            if self._http_client is not None:
+                await self._http_client.aclose()
+                self._http_client = None
             if self._nc:
                 try:
                     await self._nc.drain()
@@ -71,33 +164,63 @@ class AgentRuntime:
         assert self._js is not None
         subscription = await self._js.pull_subscribe(self.config.task_subject, durable=self.config.durable_name)
         LOGGER.info("Listening for tasks at subject %s", self.config.task_subject)
-        while not stop_event.is_set():
-            try:
-                messages = await subscription.fetch(batch=1, timeout=1.0)
-            except asyncio.TimeoutError:
-                continue
-            for msg in messages:
+        # One message is pulled per free slot: a task is never fetched before it can start (it would sit
+        # un-acked toward redelivery), and a long task never holds back the fetch for the next one.
+        slots = asyncio.Semaphore(max(1, self.config.max_concurrent_tasks))
+        running: set[asyncio.Task[None]] = set()
+        stop_waiter = asyncio.ensure_future(stop_event.wait())
+        try:
+            while not stop_event.is_set():
+                await slots.acquire()
+                fetch = asyncio.ensure_future(subscription.fetch(batch=1, timeout=TASK_FETCH_TIMEOUT))
+                await asyncio.wait({fetch, stop_waiter}, return_when=asyncio.FIRST_COMPLETED)
+                if not fetch.done():
+                    fetch.cancel()
+                    with suppress(asyncio.CancelledError, asyncio.TimeoutError):
+                        await fetch
+                    slots.release()
+                    break
                 try:
-                    task = AgentTask()
-                    task.ParseFromString(msg.data)
-                    await self._execute_task(task)
-                    await msg.ack()
-                except DecodeError as exc:
-                    LOGGER.error("Unable to decode task payload: %s", exc)
-                    await msg.ack()
-                except Exception as exc:  # noqa: BLE001
-                    LOGGER.exception("Failed to handle task: %s", exc)
-                    await msg.nak()
+                    messages = fetch.result()
+                except asyncio.TimeoutError:
+                    slots.release()
+                    continue
+                task = asyncio.create_task(self._process_task_message(messages[0]))
+                running.add(task)
+                task.add_done_callback(running.discard)
+                task.add_done_callback(lambda _: slots.release())
+            await asyncio.gather(*running)
+        finally:
+            stop_waiter.cancel()
+            for task in running:
+                task.cancel()
+
+    async def _process_task_message(self, msg: Msg) -> None:
+        try:
+            task = AgentTask()
+            if len(msg.data) > PROTO_OFFLOAD_BYTES:
+                await asyncio.to_thread(task.ParseFromString, msg.data)
+            else:
+                task.ParseFromString(msg.data)
+            await self._execute_task(task)
+            await msg.ack()
+        except DecodeError as exc:
+            LOGGER.error("Unable to decode task payload: %s", exc)
+            await msg.ack()
+        except Exception as exc:  # noqa: BLE001
+            LOGGER.exception("Failed to handle task: %s", exc)
+            await msg.nak()
 
     async def _execute_task(self, task: AgentTask) -> None:
         assert self._js is not None
         metadata = task.metadata
         project_id = metadata.project_id
-        run_id = metadata.run_id
+        run_label = metadata.run_id or "unknown"
         if project_id:
             remember_project_agent(project_id, self.config.agent_id)
-        started_at = datetime.now(timezone.utc)
-        LOGGER.info("Executing run %s for project %s", run_id or "unknown", project_id or "unknown")
+        # Formatted once per run; every step result of the run repeats the same value.
+        started_at = datetime.now(timezone.utc).isoformat()
+        LOGGER.info("Executing run %s for project %s", run_label, project_id or "unknown")
         await self._publish_result_message(
             task=task,
             status="STATUS_RUNNING",
@@ -112,8 +235,11 @@ class AgentRuntime:
             status = "STATUS_PASSED"
         except Exception as exc:  # noqa: BLE001
             error_message = str(exc)
-            LOGGER.exception("Browser execution failed for run %s", run_id or "unknown")
+            LOGGER.exception("Browser execution failed for run %s", run_label)
         finished_at = datetime.now(timezone.utc)
+        dropped_steps = self._dropped_steps.pop(metadata.run_id, 0)
+        if dropped_steps:
+            LOGGER.warning("Dropped %d step updates for run %s under backpressure", dropped_steps, run_label)
         await self._publish_result_message(
             task=task,
             status=status,
@@ -123,7 +249,7 @@ class AgentRuntime:
             finished_at=finished_at,
             history=history or {},
         )
-        LOGGER.info("Published result for run %s", run_id or "unknown")
+        LOGGER.info("Published result for run %s", run_label)
 
     async def _publish_result_message(
         self,
@@ -131,7 +257,7 @@ class AgentRuntime:
         task: AgentTask,
         status: str,
         message: str,
-        started_at: datetime,
+        started_at: str,
         finished_at: datetime | None = None,
         history: dict[str, Any] | None = None,
         partial_history: dict[str, Any] | None = None,
@@ -140,75 +266,203 @@ class AgentRuntime:
         error: str = "",
     ) -> None:
         assert self._js is not None
-        metadata = self._build_result_metadata(task)
+        is_step = kind == AgentResultKind.AGENT_RESULT_KIND_STEP
+        if is_step and len(self._pending_publishes) > STEP_PUBLISH_HIGH_WATERMARK:
+            self._dropped_steps[task.metadata.run_id] += 1
+            return
+        # Kept as UTF-8 bytes so the size checks below count bytes, not characters.
+        history_json = self._serialize_history(history) if history else b""
+        partial_history_json = self._serialize_history(partial_history) if partial_history else b""
+        max_payload = self._nc.max_payload if self._nc else 1024 * 1024
+        budget = max_payload - RESULT_ENVELOPE_BYTES
+        if len(history_json) + len(partial_history_json) + (step.ByteSize() if step else 0) > budget:
+            history_json, partial_history_json = self._fit_result_payload(
+                budget, history, history_json, partial_history, partial_history_json, step
+            )
         result = AgentResult(
-            metadata=metadata,
             kind=kind,
             status=status,
             message=message,
             error=error,
-            started_at=started_at.isoformat(),
+            started_at=started_at,
             finished_at=finished_at.isoformat() if finished_at else "",
-            history_json=self._serialize_history(history) if history else "",
+            history_json=history_json,
             testbook_id=task.testbook_id,
             environment_id=task.environment_id,
-            partial_history_json=self._serialize_history(partial_history) if partial_history else "",
+            partial_history_json=partial_history_json,
         )
+        self._fill_result_metadata(result.metadata, task)
         if step:
             result.step.CopyFrom(step)
-        await self._js.publish(self.config.result_subject, result.SerializeToString())
+        payload = await self._serialize_result(result)
+        if len(payload) > max_payload:
+            LOGGER.warning("Result for run %s exceeds %d bytes; sending status only", task.metadata.run_id, max_payload)
+            for name in ("history_json", "partial_history_json", "step"):
+                result.ClearField(name)
+            payload = await self._serialize_result(result)
+        if is_step:
+            future = asyncio.ensure_future(self._js.publish(self.config.result_subject, payload))
+            self._pending_publishes.add(future)
+            future.add_done_callback(self._on_step_publish_done)
+            return
+        # Status results go out after any step partials still in flight, so consumers see them last.
+        await self._flush_pending_publishes()
+        await self._js.publish(self.config.result_subject, payload)
+
+    @staticmethod
+    async def _serialize_result(result: AgentResult) -> bytes:
+        if result.ByteSize() > PROTO_OFFLOAD_BYTES:
+            return await asyncio.to_thread(result.SerializePartialToString)
+        return result.SerializePartialToString()
+
+    def _fit_result_payload(
+        self,
+        budget: int,
+        history: dict[str, Any] | None,
+        history_json: bytes,
+        partial_history: dict[str, Any] | None,
+        partial_history_json: bytes,
+        step: AgentStepResult | None,
+    ) -> tuple[bytes, bytes]:
+        # Shed optional content largest-first: step screenshot, then partial history, then full history.
+        step_size = step.ByteSize() if step else 0
+        if step is not None and step.screenshot_bytes:
+            step.ClearField("screenshot_bytes")
+            step.ClearField("screenshot_mime_type")
+            step_size = step.ByteSize()
+        if partial_history and len(history_json) + len(partial_history_json) + step_size > budget:
+            partial_history_json = self._serialize_history(self._summarize_history(partial_history))
+        if history and len(history_json) + len(partial_history_json) + step_size > budget:
+            history_json = self._serialize_history(self._summarize_history(history))
+        return history_json, partial_history_json
+
+    @staticmethod
+    def _summarize_history(history: dict[str, Any]) -> dict[str, Any]:
+        summary = {key: history.get(key) for key in _HISTORY_SUMMARY_KEYS}
+        urls = history.get("urls") or []
+        summary["final_url"] = urls[-1] if urls else ""
+        summary["truncated"] = True
+        return summary
+
+    def _on_step_publish_done(self, future: asyncio.Future[Any]) -> None:
+        self._pending_publishes.discard(future)
+        if future.cancelled():
+            return
+        exc = future.exception()
+        if exc is not None:
+            LOGGER.warning("Failed to publish step result: %s", exc)
+
+    async def _flush_pending_publishes(self) -> None:
+        if self._pending_publishes:
+            await asyncio.gather(*self._pending_publishes, return_exceptions=True)
 
-    def _build_result_metadata(self, task: AgentTask) -> AgentMetadata:
+    def _fill_result_metadata(self, metadata: AgentMetadata, task: AgentTask) -> None:
+        # Filled in place on the result; proto3 string fields are never None, so no defaulting.
         task_metadata = task.metadata
-        return AgentMetadata(
-            agent_id=self.config.agent_id,
-            project_id=task_metadata.project_id or "",
-            run_id=task_metadata.run_id or "",
-            agent_version=self.config.version,
-        )
+        metadata.MergeFrom(self._metadata_template)
+        metadata.project_id = task_metadata.project_id
+        metadata.run_id = task_metadata.run_id
 
     async def _heartbeat_loop(self, stop_event: asyncio.Event) -> None:
         assert self._nc is not None
+        # Only the timestamp changes between ticks, so one message is reused for the loop's lifetime.
+        heartbeat = AgentHeartbeat(
+            metadata=self._metadata_template,
+            status="online",
+            capabilities=["browser_use"],
+        )
         while not stop_event.is_set():
-            heartbeat = AgentHeartbeat(
-                metadata=AgentMetadata(
-                    agent_id=self.config.agent_id,
-                    project_id="",
-                    run_id="",
-                    agent_version=self.config.version,
-                ),
-                status="online",
-                timestamp=int(datetime.now(timezone.utc).timestamp()),
-                capabilities=["browser_use"],
-            )
-            await self._nc.publish(self.config.heartbeat_subject, heartbeat.SerializeToString())
+            heartbeat.timestamp = int(time.time())
+            if self._heartbeat_publish is not None and not self._heartbeat_publish.done():
+                LOGGER.debug("Previous heartbeat still pending; skipping tick")
+            else:
+                self._heartbeat_publish = asyncio.ensure_future(
+                    self._nc.publish(self.config.heartbeat_subject, heartbeat.SerializePartialToString())
+                )
+                self._heartbeat_publish.add_done_callback(self._on_heartbeat_publish_done)
             await asyncio.sleep(self.config.heartbeat_interval)
 
-    async def _run_browser_use(self, task: AgentTask, started_at: datetime) -> dict[str, Any]:
+    @staticmethod
+    def _on_heartbeat_publish_done(future: asyncio.Future[Any]) -> None:
+        if future.cancelled():
+            return
+        exc = future.exception()
+        if exc is not None:
+            LOGGER.warning("Failed to publish heartbeat: %s", exc)
+
+    async def _run_browser_use(self, task: AgentTask, started_at: str) -> dict[str, Any]:
         instructions = task.instructions or "Run testbook"
+        # ChatOpenAI builds a new AsyncOpenAI per call; a shared transport keeps connections warm.
+        # The model object itself is per agent because browser-use wraps its ainvoke for token accounting.
+        if self._http_client is None:
+            self._http_client = DefaultAsyncHttpxClient()
         llm = ChatOpenAI(
-            model=self.llm_config.model, api_key=self.llm_config.api_key, base_url=self.llm_config.base_url
-        )
-        ensure_chromium_installed()
-        chromium_path = find_bundled_chromium() or find_cached_chromium()
-        if not chromium_path:
-            raise RuntimeError("Chromium executable not found. Run `playwright install chromium`.")
-        browser = Browser(
-            headless=self.config.browser_headless,
-            chromium_sandbox=self.config.chromium_sandbox,
-            executable_path=chromium_path,
+            model=self.llm_config.model,
+            api_key=self.llm_config.api_key,
+            base_url=self.llm_config.base_url,
+            http_client=self._http_client,
         )
+        browser = await self._acquire_browser()
         agent = BrowserUseAgent(llm=llm, task=instructions, browser=browser)
+        partial = _PartialHistory(snapshot=self._empty_history())
 
         async def _on_step_end(active_agent: BrowserUseAgent) -> None:
-            await self._handle_step_completion(active_agent, task, started_at)
+            await self._handle_step_completion(active_agent, task, started_at, partial)
 
-        history = await agent.run(max_steps=self.config.max_steps, on_step_end=_on_step_end)
+        try:
+            history = await agent.run(max_steps=self.config.max_steps, on_step_end=_on_step_end)
+        except BaseException:
+            # A failed run may leave a kept-alive browser wedged; never hand it to the next task.
+            if self.config.reuse_browser:
+                await self._close_browser(browser)
+            raise
+        await self._release_browser(browser)
         return self._build_history_snapshot(history)
 
-    async def _handle_step_completion(self, agent: BrowserUseAgent, task: AgentTask, started_at: datetime) -> None:
+    async def _acquire_browser(self) -> Browser:
+        browser, self._browser = self._browser, None
+        if browser is not None:
+            return browser
+        return Browser(
+            headless=self.config.browser_headless,
+            chromium_sandbox=self.config.chromium_sandbox,
+            executable_path=await self._resolve_chromium_path(),
+            keep_alive=self.config.reuse_browser,
+        )
+
+    async def _release_browser(self, browser: Browser) -> None:
+        if not self.config.reuse_browser:
+            return
+        if self._browser is None:
+            self._browser = browser
+        else:
+            await self._close_browser(browser)
+
+    @staticmethod
+    async def _close_browser(browser: Browser) -> None:
+        try:
+            await browser.kill()
+        except Exception:
+            LOGGER.warning("Failed to close browser", exc_info=True)
+
+    async def _resolve_chromium_path(self) -> str:
+        if self._chromium_path is None:
+            self._chromium_path = await asyncio.to_thread(self._locate_chromium)
+        return self._chromium_path
+
+    @staticmethod
+    def _locate_chromium() -> str:
+        ensure_chromium_installed()
+        chromium_path = find_bundled_chromium() or find_cached_chromium()
+        if not chromium_path:
+            raise RuntimeError("Chromium executable not found. Run `playwright install chromium`.")
+        return chromium_path
+
+    async def _handle_step_completion(
+        self, agent: BrowserUseAgent, task: AgentTask, started_at: str, partial: _PartialHistory
+    ) -> None:
         try:
-            step_result, partial_history = await self._prepare_step_payload(agent)
+            step_result, partial_history = await self._prepare_step_payload(agent, partial)
         except Exception:  # noqa: BLE001
             LOGGER.exception("Failed to prepare step payload for run %s", task.metadata.run_id or "unknown")
             return
@@ -224,7 +478,9 @@ class AgentRuntime:
             kind=AgentResultKind.AGENT_RESULT_KIND_STEP,
         )
 
-    async def _prepare_step_payload(self, agent: BrowserUseAgent) -> tuple[AgentStepResult | None, dict[str, Any]]:
+    async def _prepare_step_payload(
+        self, agent: BrowserUseAgent, partial: _PartialHistory
+    ) -> tuple[AgentStepResult | None, dict[str, Any]]:
         history_obj = getattr(agent, "history", None)
         steps = getattr(history_obj, "history", None) if history_obj is not None else None
         if not history_obj or not steps:
@@ -232,20 +488,24 @@ class AgentRuntime:
         step_index = len(steps)
         last_entry = steps[-1]
 
-        screenshot_bytes, mime_type = await self._load_screenshot_bytes(
-            getattr(last_entry.state, "screenshot_path", None)
-        )
+        screenshot_bytes, mime_type = b"", ""
+        if self.config.send_screenshots:
+            screenshot_bytes, mime_type = await self._load_screenshot_bytes(
+                getattr(last_entry.state, "screenshot_path", None)
+            )
         model_actions_payload: list[Any] = []
         model_output_payload: dict[str, Any] | None = None
         if last_entry.model_output:
             model_output_payload = last_entry.model_output.model_dump(exclude_none=True)
-            for action in last_entry.model_output.action:
-                with suppress(Exception):
-                    model_actions_payload.append(action.model_dump(exclude_none=True))
+            # The output dump already holds each action dumped with the same options; don't walk them twice.
+            model_actions_payload = list(model_output_payload.get("action") or [])
         action_results_payload: list[dict[str, Any]] = []
+        error_message = ""
         for result in last_entry.result:
             with suppress(Exception):
                 action_results_payload.append(result.model_dump(exclude_none=True))
+            if not error_message and result.error:
+                error_message = str(result.error)
 
         state_payload: dict[str, Any] = {}
         url_value = ""
@@ -254,7 +514,6 @@ class AgentRuntime:
             url_value = getattr(last_entry.state, "url", "") or ""
             screenshot_path = getattr(last_entry.state, "screenshot_path", "") or ""
             state_payload = self._safe_state_dump(last_entry.state)
-        error_message = next((str(res.error) for res in last_entry.result if res.error), "")
         status = "STEP_COMPLETED" if not error_message else "STEP_FAILED"
         observation = last_entry.state_message or ""
         timestamp = ""
@@ -284,18 +543,66 @@ class AgentRuntime:
             timestamp=timestamp,
             state_json=self._json_dumps(state_payload),
         )
-        partial_history = self._build_history_snapshot(history_obj)
+        partial_history = self._extend_partial_history(partial, history_obj, steps)
         return step_payload, partial_history
 
+    def _extend_partial_history(self, partial: _PartialHistory, history_obj: Any, steps: list[Any]) -> dict[str, Any]:
+        new_entries = steps[partial.steps_seen :]
+        if not new_entries:
+            return partial.snapshot
+        try:
+            delta_obj = history_obj.model_copy(update={"history": new_entries})
+        except Exception:  # noqa: BLE001
+            partial.snapshot = self._build_history_snapshot(history_obj, include_screenshots=False)
+            partial.steps_seen = len(steps)
+            return partial.snapshot
+        # Each step already carries its own screenshot; the full gallery is only sent with the final history.
+        delta = self._build_history_snapshot(delta_obj, include_screenshots=False)
+        snapshot = partial.snapshot
+        for key in _LIST_HISTORY_KEYS:
+            snapshot[key].extend(delta[key])
+        for key in _LAST_ENTRY_HISTORY_KEYS:
+            snapshot[key] = delta[key]
+        snapshot["has_errors"] = bool(snapshot["has_errors"] or delta["has_errors"])
+        snapshot["number_of_steps"] = len(steps)
+        with suppress(Exception):
+            snapshot["duration_seconds"] = int(history_obj.total_duration_seconds())
+        partial.steps_seen = len(steps)
+        return snapshot
+
     async def _load_screenshot_bytes(self, path_value: str | None) -> tuple[bytes, str]:
         if not path_value:
             return b"", ""
         path = Path(path_value)
         if not path.exists():
             return b"", ""
-        data = await asyncio.to_thread(path.read_bytes)
-        mime_type, _ = mimetypes.guess_type(path_value)
-        return data, mime_type or "image/png"
+        return await asyncio.to_thread(self._read_screenshot, path, _guess_mime_type(path_value))
+
+    def _read_screenshot(self, path: Path, mime_type: str) -> tuple[bytes, str]:
+        data = path.read_bytes()
+        # Lossy re-encoding is opt-in: consumers that diff screenshots need the captured bytes.
+        if not self.config.compress_screenshots:
+            return data, mime_type
+        return self._compress_image_bytes(data, mime_type)
+
+    @staticmethod
+    def _compress_image_bytes(data: bytes, mime_type: str) -> tuple[bytes, str]:
+        if not _WEBP_SUPPORTED or mime_type == "image/webp":
+            return data, mime_type
+        buffer = getattr(_SCRATCH, "buffer", None)
+        if buffer is None:
+            buffer = _SCRATCH.buffer = io.BytesIO()
+        buffer.seek(0)
+        buffer.truncate()
+        try:
+            with Image.open(io.BytesIO(data)) as image:
+                image.save(buffer, format="WEBP", quality=WEBP_QUALITY, method=4)
+        except Exception:  # noqa: BLE001
+            return data, mime_type
+        encoded = buffer.getvalue()
+        if len(encoded) >= len(data):
+            return data, mime_type
+        return encoded, "image/webp"
 
     def _safe_state_dump(self, state: Any) -> dict[str, Any]:
         if hasattr(state, "to_dict"):
@@ -308,7 +615,11 @@ class AgentRuntime:
     def _json_dumps(self, value: Any) -> str:
         if value is None:
             return ""
-        return json.dumps(value, default=self._json_default, ensure_ascii=False)
+        with suppress(orjson.JSONEncodeError):
+            return orjson.dumps(value, default=self._json_default, option=orjson.OPT_NON_STR_KEYS).decode()
+        # orjson rejects a few inputs (integers past 64 bits, lone surrogates); keep its compact layout for those
+        # too, ASCII-escaped so the proto string field can always encode the result.
+        return json.dumps(value, default=self._json_default, separators=(",", ":"))
 
     def _json_default(self, obj: Any) -> Any:
         if isinstance(obj, datetime):
@@ -320,7 +631,7 @@ class AgentRuntime:
             return vars(obj)
         return str(obj)
 
-    def _build_history_snapshot(self, history_obj: Any) -> dict[str, Any]:
+    def _build_history_snapshot(self, history_obj: Any, *, include_screenshots: bool = True) -> dict[str, Any]:
         if history_obj is None:
             return self._empty_history()
         if isinstance(history_obj, dict):
@@ -328,7 +639,8 @@ class AgentRuntime:
         run_history = self._empty_history()
         with suppress(Exception):
             run_history["urls"] = self._string_list(history_obj.urls())
-        run_history["screenshots"] = self._build_screenshot_list(history_obj)
+        if include_screenshots:
+            run_history["screenshots"] = self._build_screenshot_list(history_obj)
         with suppress(Exception):
             run_history["action_names"] = self._string_list(history_obj.action_names())
         with suppress(Exception):
@@ -370,17 +682,7 @@ class AgentRuntime:
             run_history["structured_output"] = self._stringify(structured_output)
         else:
             run_history["structured_output"] = structured_output
-        run_history["screenshots"] = self._string_list(run_history.get("screenshots"))
-        run_history["model_actions"] = self._string_list(run_history.get("model_actions"))
-        run_history["model_outputs"] = self._string_list(run_history.get("model_outputs"))
-        run_history["model_thoughts"] = self._string_list(run_history.get("model_thoughts"))
-        run_history["action_results"] = self._string_list(run_history.get("action_results"))
-        run_history["action_history"] = self._string_list(run_history.get("action_history"))
-        run_history["urls"] = self._string_list(run_history.get("urls"))
-        run_history["action_names"] = self._string_list(run_history.get("action_names"))
-        run_history["extracted_content"] = self._string_list(run_history.get("extracted_content"))
-        run_history["errors"] = self._nullable_string_list(run_history.get("errors"))
-        return self._json_safe(run_history)
+        return run_history
 
     @staticmethod
     def _empty_history() -> dict[str, Any]:
@@ -405,6 +707,8 @@ class AgentRuntime:
         }
 
     def _build_screenshot_list(self, history_obj: Any) -> list[str]:
+        if not self.config.send_screenshots:
+            return []
         try:
             raw_screenshots = history_obj.screenshots(return_none_if_not_screenshot=True)
         except Exception:  # noqa: BLE001
@@ -425,9 +729,7 @@ class AgentRuntime:
         except Exception:  # noqa: BLE001
             path = None
         if isinstance(path, str) and path:
-            mime_type, _ = mimetypes.guess_type(path)
-            if mime_type:
-                return mime_type
+            return _guess_mime_type(path)
         return "image/png"
 
     @staticmethod
@@ -458,10 +760,8 @@ class AgentRuntime:
         if hasattr(value, "dict") and callable(value.dict):
             with suppress(Exception):
                 return self._json_safe(value.dict())
-        with suppress(TypeError, ValueError):
-            json.dumps(value, ensure_ascii=False, allow_nan=False)
-            return value
-        return self._stringify(value)
+        # Every JSON-native type is handled above, so anything left would fail to encode anyway.
+        return str(value)
 
     def _string_list(self, value: Any) -> list[str]:
         result: list[str] = []
@@ -501,15 +801,23 @@ class AgentRuntime:
             return ""
         if isinstance(value, str):
             return value
+        # Containers only: orjson would quote scalars like datetimes that the stdlib falls back to str() for.
+        if isinstance(value, (dict, list, tuple)):
+            with suppress(orjson.JSONEncodeError):
+                return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS).decode()
         try:
-            return json.dumps(value, ensure_ascii=False)
+            return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
         except TypeError:
             return str(value)
 
-    def _serialize_history(self, history: dict[str, Any]) -> str:
+    def _serialize_history(self, history: dict[str, Any]) -> bytes:
         if not history:
-            return ""
-        return json.dumps(history, default=self._json_default)
+            return b""
+        with suppress(orjson.JSONEncodeError):
+            return orjson.dumps(history, default=self._json_default, option=orjson.OPT_NON_STR_KEYS)
+        # orjson refuses strings it can't encode as UTF-8 (e.g. lone surrogates from scraped text); the stdlib
+        # escapes them to ASCII, which also keeps the byte count exact.
+        return json.dumps(history, default=self._json_default, separators=(",", ":")).encode()
 
 
 __all__ = ["AgentRuntime"]
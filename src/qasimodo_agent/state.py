@@ -1,18 +1,25 @@
 from __future__ import annotations
 
 import contextlib
-import json
+import copy
+import functools
 import os
-import re
+import tempfile
+import time
+import tomllib
 import uuid
 from dataclasses import dataclass
 from datetime import datetime, timezone
 from pathlib import Path
 
+import orjson
+
 
 STATE_DIR = Path.home() / ".qasimodo-agent"
 STATE_FILE = STATE_DIR / "agents.json"
 DEFAULT_AGENT_KEY = "__default__"
+# Plain str form for the per-call stat, skipping pathlib's wrapper on the hot path.
+_STATE_FILE_PATH = os.fspath(STATE_FILE)
 
 
 @dataclass(slots=True)
@@ -22,12 +29,50 @@ class AgentState:
     core_tokens: dict[str, dict[str, str]] | None = None
 
 
+# Parsed state keyed on the file's (inode, mtime_ns, size); callers always get a copy.
+_STATE_CACHE: tuple[tuple[int, int, int], AgentState] | None = None
+
+
+def _invalidate_state_cache() -> None:
+    # For writers that bypass _save_state or a filesystem whose stat can't tell two versions apart.
+    global _STATE_CACHE
+    _STATE_CACHE = None
+
+
+def _copy_state(state: AgentState) -> AgentState:
+    return AgentState(
+        agents=dict(state.agents),
+        version=state.version,
+        core_tokens=copy.deepcopy(state.core_tokens) if state.core_tokens is not None else None,
+    )
+
+
+def _state_file_key() -> tuple[int, int, int] | None:
+    try:
+        stat = os.stat(_STATE_FILE_PATH)
+    except OSError:
+        return None
+    # Saves rename a fresh file into place, so the inode changes even within one mtime tick.
+    return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+
 def _load_state() -> AgentState:
-    if not STATE_FILE.exists():
+    global _STATE_CACHE
+    key = _state_file_key()
+    if key is None:
+        _STATE_CACHE = None
         return AgentState(agents={}, version=None, core_tokens={})
+    if _STATE_CACHE is not None and _STATE_CACHE[0] == key:
+        return _copy_state(_STATE_CACHE[1])
+    state = _read_state()
+    _STATE_CACHE = (key, _copy_state(state))
+    return state
+
+
+def _read_state() -> AgentState:
     try:
-        with STATE_FILE.open("r", encoding="utf-8") as handle:
-            data = json.load(handle)
+        raw = STATE_FILE.read_bytes()
+        data = orjson.loads(raw)
     except Exception:  # noqa: BLE001
         return AgentState(agents={}, version=None, core_tokens={})
     if isinstance(data, dict):
@@ -46,37 +91,47 @@ def _load_state() -> AgentState:
 def _normalize_agents(value: object) -> dict[str, str]:
     if not isinstance(value, dict):
         return {}
-    normalized: dict[str, str] = {}
-    for key, val in value.items():
-        normalized[str(key)] = str(val)
-    return normalized
+    return {str(key): str(val) for key, val in value.items()}
 
 
 def _save_state(state: AgentState) -> None:
+    global _STATE_CACHE
+    # Nothing to write if the file on disk is still exactly what was last loaded or saved.
+    if _STATE_CACHE is not None and _STATE_CACHE[1] == state and _STATE_CACHE[0] == _state_file_key():
+        return
     STATE_DIR.mkdir(parents=True, exist_ok=True)
     payload = {"agents": state.agents, "version": state.version, "core_tokens": state.core_tokens or {}}
-    fd = os.open(STATE_FILE, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
-    with os.fdopen(fd, "w", encoding="utf-8") as handle:
-        json.dump(payload, handle, indent=2)
-    with contextlib.suppress(OSError):
-        os.chmod(STATE_FILE, 0o600)
+    data = orjson.dumps(payload)
+    # Write a sibling file and rename it over the old one so readers never see a torn file.
+    # mkstemp creates it exclusively with mode 0o600, so no chmod is needed afterwards.
+    fd, tmp_file = tempfile.mkstemp(prefix=f"{STATE_FILE.name}.", suffix=".tmp", dir=STATE_DIR)
+    try:
+        with os.fdopen(fd, "wb") as handle:
+            handle.write(data)
+        os.replace(tmp_file, STATE_FILE)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.unlink(tmp_file)
+        raise
+    key = _state_file_key()
+    _STATE_CACHE = (key, _copy_state(state)) if key is not None else None
 
 
+@functools.lru_cache(maxsize=1)
 def _read_pyproject_version() -> str:
     try:
         root = Path(__file__).resolve().parents[2]
     except IndexError:  # pragma: no cover - defensive
         return "dev"
     pyproject_file = root / "pyproject.toml"
-    if not pyproject_file.exists():
-        return "dev"
     try:
-        content = pyproject_file.read_text(encoding="utf-8")
-    except OSError:
+        with pyproject_file.open("rb") as handle:
+            data = tomllib.load(handle)
+    except (OSError, tomllib.TOMLDecodeError):
         return "dev"
-    match = re.search(r'^version\s*=\s*"([^"]+)"', content, re.MULTILINE)
-    if match:
-        return match.group(1)
+    version = data.get("project", {}).get("version")
+    if isinstance(version, str) and version:
+        return version
     return "dev"
 
 
@@ -137,7 +192,10 @@ def save_core_token(agent_id: str, token: str, expires_at: str | None = None) ->
 
 
 def clear_core_token(agent_id: str) -> None:
-    state = _load_state()
+    _clear_core_token(_load_state(), agent_id)
+
+
+def _clear_core_token(state: AgentState, agent_id: str) -> None:
     tokens = state.core_tokens or {}
     if agent_id in tokens:
         tokens.pop(agent_id, None)
@@ -151,28 +209,38 @@ def get_core_token_record(agent_id: str) -> dict[str, str] | None:
     return tokens.get(agent_id)
 
 
+@functools.lru_cache(maxsize=8)
+def _expiry_timestamp(expires_at: str) -> float | None:
+    # A token's expiry string is checked on every refresh but only changes when the token does.
+    try:
+        expiry_dt = datetime.fromisoformat(expires_at)
+    except (TypeError, ValueError):
+        return None
+    if expiry_dt.tzinfo is None:
+        expiry_dt = expiry_dt.replace(tzinfo=timezone.utc)
+    return expiry_dt.timestamp()
+
+
 def is_core_token_valid(agent_id: str, now: datetime | None = None) -> bool:
-    record = get_core_token_record(agent_id)
+    state = _load_state()
+    record = (state.core_tokens or {}).get(agent_id)
     if not record:
         return False
     token = record.get("token")
     if not token:
-        clear_core_token(agent_id)
+        _clear_core_token(state, agent_id)
         return False
     expires_at = record.get("expires_at") or ""
     if not expires_at:
         return True
-    try:
-        expiry_dt = datetime.fromisoformat(expires_at)
-    except (TypeError, ValueError):
-        clear_core_token(agent_id)
+    expiry = _expiry_timestamp(expires_at)
+    if expiry is None:
+        _clear_core_token(state, agent_id)
         return False
-    if expiry_dt.tzinfo is None:
-        expiry_dt = expiry_dt.replace(tzinfo=timezone.utc)
-    now = now or datetime.now(timezone.utc)
-    if now < expiry_dt:
+    now_ts = now.timestamp() if now is not None else time.time()
+    if now_ts < expiry:
         return True
-    clear_core_token(agent_id)
+    _clear_core_token(state, agent_id)
     return False
 
 
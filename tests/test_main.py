@@ -0,0 +1,31 @@
+from __future__ import annotations
+
+import asyncio
+from datetime import datetime, timezone
+
+from qasimodo_agent.__main__ import AgentController, AgentState, drain_events
+from qasimodo_agent.proto import AgentHeartbeat, AgentMetadata
+
+
+def test_drain_events_ignores_malformed_heartbeat() -> None:
+    async def scenario() -> AgentState:
+        controller = AgentController()
+        state = AgentState(nats_url="nats://localhost:4222", agent_id="agent-123", authenticated=True)
+        heartbeat = AgentHeartbeat(
+            metadata=AgentMetadata(agent_id="agent-123", agent_version="1.2.3"),
+            status="online",
+            timestamp=1700000000,
+        )
+        controller.latest_heartbeat = heartbeat.SerializeToString()
+        await drain_events(controller, state)
+        # Truncated varint: not a valid AgentHeartbeat encoding.
+        controller.latest_heartbeat = b"\x08\xff"
+        await drain_events(controller, state)
+        return state
+
+    state = asyncio.run(scenario())
+
+    assert state.status == "online"
+    assert state.version == "1.2.3"
+    assert state.last_heartbeat == datetime.fromtimestamp(1700000000, tz=timezone.utc)
+    assert len(state.logs) == 1
@@ -2,6 +2,8 @@ from __future__ import annotations
 
 import base64
 
+from google.protobuf.internal import api_implementation
+
 from qasimodo_agent.proto import (
     AgentHeartbeat,
     AgentMetadata,
@@ -10,6 +12,12 @@ from qasimodo_agent.proto import (
     AgentTask,
 )
 
+# Snapshot for cross-language compatibility (dashboard tests decode the same bytes)
+TASK_SNAPSHOT = base64.b64decode(
+    "CiMKCWFnZW50LTEyMxIIcHJvai03ODkaB3J1bi0wMDEiA2RldhIHdGJrLTQ1NhoHZW52"
+    "LWFiYyIMRG8gc29tZXRoaW5nKhJodHRwczovL2NvcmUubG9jYWwyCXRva2VuLXh5eg=="
+)
+
 
 def test_agent_task_roundtrip() -> None:
     task = AgentTask(
@@ -26,6 +34,8 @@ def test_agent_task_roundtrip() -> None:
         core_token="token-xyz",
     )
     encoded = task.SerializeToString()
+    # Wire compatibility first: any encoding regression fails here before the per-field checks.
+    assert encoded == TASK_SNAPSHOT
     parsed = AgentTask()
     parsed.ParseFromString(encoded)
     assert parsed.metadata.agent_id == "agent-123"
@@ -33,11 +43,6 @@ def test_agent_task_roundtrip() -> None:
     assert parsed.metadata.run_id == "run-001"
     assert parsed.metadata.agent_version == "dev"
     assert parsed.instructions == "Do something"
-    # Snapshot for cross-language compatibility (dashboard tests decode the same bytes)
-    assert base64.b64encode(encoded).decode() == (
-        "CiMKCWFnZW50LTEyMxIIcHJvai03ODkaB3J1bi0wMDEiA2RldhIHdGJrLTQ1NhoHZW52"
-        "LWFiYyIMRG8gc29tZXRoaW5nKhJodHRwczovL2NvcmUubG9jYWwyCXRva2VuLXh5eg=="
-    )
 
 
 def test_agent_result_roundtrip() -> None:
@@ -82,3 +87,8 @@ def test_agent_heartbeat_roundtrip() -> None:
     parsed.ParseFromString(encoded)
     assert parsed.capabilities == ["browser_use"]
     assert parsed.metadata.agent_version == "dev"
+
+
+def test_protobuf_uses_native_backend() -> None:
+    # The runtime serializes every step result; the pure-Python backend is an order of magnitude slower.
+    assert api_implementation.Type() in ("upb", "cpp")
@@ -0,0 +1,302 @@
+from __future__ import annotations
+
+import asyncio
+import io
+import json
+from pathlib import Path
+from typing import Any
+
+import nats
+import pytest
+
+from qasimodo_agent.config import AgentConfig, LLMConfig
+from qasimodo_agent.proto import AgentMetadata, AgentResult, AgentResultKind, AgentStepResult, AgentTask
+from qasimodo_agent.runtime import RESULT_ENVELOPE_BYTES, STEP_PUBLISH_HIGH_WATERMARK, _WEBP_SUPPORTED, AgentRuntime
+
+
+class _FakeSubscription:
+    def __init__(self, messages: list[Any]) -> None:
+        self.messages = list(messages)
+        self.batches: list[int] = []
+
+    async def fetch(self, batch: int, timeout: float) -> list[Any]:
+        self.batches.append(batch)
+        if not self.messages:
+            await asyncio.sleep(timeout)
+            raise nats.errors.TimeoutError
+        return [self.messages.pop(0)]
+
+
+class _FakeNATS:
+    def __init__(self, max_payload: int) -> None:
+        self.max_payload = max_payload
+
+
+class _FakeJetStream:
+    def __init__(self, subscription: _FakeSubscription | None = None) -> None:
+        self.subscription = subscription
+        self.published: list[bytes] = []
+
+    async def publish(self, subject: str, payload: bytes) -> None:
+        self.published.append(payload)
+
+    async def pull_subscribe(self, subject: str, durable: str) -> _FakeSubscription:
+        return self.subscription
+
+
+class _GatedJetStream(_FakeJetStream):
+    """Holds every publish until the gate opens, recording how many had completed when each was issued."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.gate = asyncio.Event()
+        self.completed_at_call: list[int] = []
+
+    async def publish(self, subject: str, payload: bytes) -> None:
+        self.completed_at_call.append(len(self.published))
+        await self.gate.wait()
+        self.published.append(payload)
+
+
+def _runtime(**overrides: Any) -> AgentRuntime:
+    config = AgentConfig(agent_id="agent-123", nats_url="nats://localhost:4222", heartbeat_interval=30, **overrides)
+    llm_config = LLMConfig(model="test-model", api_key="test-key", base_url="http://localhost")
+    return AgentRuntime(config=config, llm_config=llm_config)
+
+
+def _task() -> AgentTask:
+    return AgentTask(metadata=AgentMetadata(project_id="proj-789", run_id="run-001"), testbook_id="tbk-456")
+
+
+def _write_png(path: Path) -> bytes:
+    image_module = pytest.importorskip("PIL.Image")
+    buffer = io.BytesIO()
+    image_module.new("RGB", (64, 64), "white").save(buffer, format="PNG")
+    path.write_bytes(buffer.getvalue())
+    return buffer.getvalue()
+
+
+def _publish(runtime: AgentRuntime, **kwargs: Any) -> AgentResult:
+    runtime._js = _FakeJetStream()
+    asyncio.run(runtime._publish_result_message(task=_task(), message="", started_at="", **kwargs))
+    (payload,) = runtime._js.published
+    result = AgentResult()
+    result.ParseFromString(payload)
+    return result
+
+
+def test_consume_tasks_fetches_one_task_per_free_slot(monkeypatch: pytest.MonkeyPatch) -> None:
+    runtime = _runtime(max_concurrent_tasks=2)
+    subscription = _FakeSubscription(["slow", "fast"])
+    runtime._js = _FakeJetStream(subscription)
+    finished: list[str] = []
+
+    async def scenario() -> None:
+        stop_event = asyncio.Event()
+        fast_done = asyncio.Event()
+
+        async def process(msg: str) -> None:
+            # The slow task only completes once the fast one has run alongside it.
+            if msg == "slow":
+                await fast_done.wait()
+            else:
+                fast_done.set()
+            finished.append(msg)
+            if len(finished) == 2:
+                stop_event.set()
+
+        monkeypatch.setattr(runtime, "_process_task_message", process)
+        await asyncio.wait_for(runtime._consume_tasks(stop_event), timeout=5)
+
+    asyncio.run(scenario())
+
+    assert finished == ["fast", "slow"]
+    assert set(subscription.batches) == {1}
+
+
+def test_terminal_result_budget_counts_bytes_not_characters() -> None:
+    runtime = _runtime()
+    runtime._nc = _FakeNATS(max_payload=16 * 1024)
+    runtime._js = _FakeJetStream()
+    budget = 16 * 1024 - RESULT_ENVELOPE_BYTES
+    # Three UTF-8 bytes per character: under the budget in characters, well over it in bytes.
+    history = {"extracted_content": ["検" * (budget // 2)], "number_of_steps": 3, "is_done": True}
+    assert len(json.dumps(history, ensure_ascii=False)) < budget < len(json.dumps(history, ensure_ascii=False).encode())
+
+    asyncio.run(
+        runtime._publish_result_message(
+            task=_task(), status="STATUS_PASSED", message="Run completed", started_at="", history=history
+        )
+    )
+
+    (payload,) = runtime._js.published
+    result = AgentResult()
+    result.ParseFromString(payload)
+    summary = json.loads(result.history_json)
+    assert summary["truncated"] is True
+    assert summary["number_of_steps"] == 3
+    assert summary["is_done"] is True
+
+
+def test_publish_result_sends_history_that_fits_in_full() -> None:
+    runtime = _runtime()
+    runtime._nc = _FakeNATS(max_payload=16 * 1024)
+    history = {"urls": ["https://example.com"], "extracted_content": ["ok"], "number_of_steps": 1}
+
+    result = _publish(runtime, status="STATUS_PASSED", history=history)
+
+    assert json.loads(result.history_json) == history
+
+
+def test_publish_result_serializes_history_with_lone_surrogate() -> None:
+    runtime = _runtime()
+    history = {"extracted_content": ["a\ud800"], "number_of_steps": 1}
+
+    result = _publish(runtime, status="STATUS_PASSED", history=history)
+
+    assert json.loads(result.history_json) == history
+
+
+def test_publish_result_summarizes_history_over_budget() -> None:
+    runtime = _runtime()
+    runtime._nc = _FakeNATS(max_payload=16 * 1024)
+    history = {
+        "urls": ["https://example.com/start", "https://example.com/done"],
+        "extracted_content": ["x" * 32 * 1024],
+        "number_of_steps": 2,
+        "duration_seconds": 12,
+        "is_done": True,
+        "is_successful": True,
+        "has_errors": False,
+        "final_result": "done",
+    }
+
+    result = _publish(runtime, status="STATUS_PASSED", history=history)
+
+    assert json.loads(result.history_json) == {
+        "number_of_steps": 2,
+        "duration_seconds": 12,
+        "is_done": True,
+        "is_successful": True,
+        "has_errors": False,
+        "final_result": "done",
+        "final_url": "https://example.com/done",
+        "truncated": True,
+    }
+
+
+def test_publish_result_clears_optional_fields_when_summary_still_overflows() -> None:
+    runtime = _runtime()
+    runtime._nc = _FakeNATS(max_payload=16 * 1024)
+    # The summary keeps final_result, so an oversized one leaves nothing that fits.
+    partial_history = {"final_result": "x" * 32 * 1024, "number_of_steps": 1}
+    step = AgentStepResult(step_index=1, observation="y" * 32 * 1024)
+
+    result = _publish(
+        runtime,
+        status="STATUS_RUNNING",
+        partial_history=partial_history,
+        step=step,
+        kind=AgentResultKind.AGENT_RESULT_KIND_STEP,
+    )
+
+    assert result.status == "STATUS_RUNNING"
+    assert result.history_json == ""
+    assert result.partial_history_json == ""
+    assert not result.HasField("step")
+
+
+def test_fit_result_payload_sheds_step_screenshot_before_history() -> None:
+    runtime = _runtime()
+    partial_history = {"urls": ["https://example.com"], "number_of_steps": 1}
+    partial_history_json = runtime._serialize_history(partial_history)
+    step = AgentStepResult(step_index=1, screenshot_mime_type="image/png", screenshot_bytes=b"\x00" * 4096)
+
+    history_json, fitted_partial_json = runtime._fit_result_payload(
+        1024, None, b"", partial_history, partial_history_json, step
+    )
+
+    assert history_json == b""
+    assert fitted_partial_json == partial_history_json
+    assert step.screenshot_bytes == b""
+    assert step.screenshot_mime_type == ""
+
+
+def test_step_publishes_past_watermark_are_dropped_and_flushed_before_status() -> None:
+    runtime = _runtime()
+    js = _GatedJetStream()
+    runtime._js = js
+
+    async def scenario() -> None:
+        for index in range(1, STEP_PUBLISH_HIGH_WATERMARK + 3):
+            await runtime._publish_result_message(
+                task=_task(),
+                status="STATUS_RUNNING",
+                message="",
+                started_at="",
+                step=AgentStepResult(step_index=index),
+                kind=AgentResultKind.AGENT_RESULT_KIND_STEP,
+            )
+        status = asyncio.ensure_future(
+            runtime._publish_result_message(task=_task(), status="STATUS_PASSED", message="", started_at="")
+        )
+        await asyncio.sleep(0)
+        assert not status.done()
+        js.gate.set()
+        await status
+
+    asyncio.run(scenario())
+
+    results = []
+    for payload in js.published:
+        result = AgentResult()
+        result.ParseFromString(payload)
+        results.append(result)
+    # Steps are shed only once more than the watermark are in flight.
+    assert [result.step.step_index for result in results[:-1]] == list(range(1, STEP_PUBLISH_HIGH_WATERMARK + 2))
+    assert runtime._dropped_steps["run-001"] == 1
+    assert results[-1].status == "STATUS_PASSED"
+    assert js.completed_at_call[-1] == STEP_PUBLISH_HIGH_WATERMARK + 1
+
+
+def test_step_json_fields_use_compact_layout() -> None:
+    runtime = _runtime()
+
+    assert runtime._json_dumps({"action": [{"click": {"index": 3}}], "text": "é"}) == (
+        '{"action":[{"click":{"index":3}}],"text":"é"}'
+    )
+    assert runtime._stringify({"urls": ["a", "b"]}) == '{"urls":["a","b"]}'
+    # Values orjson rejects go through the stdlib with the same separators.
+    assert runtime._json_dumps({"count": 2**70, "text": "a\ud800"}) == (
+        '{"count":1180591620717411303424,"text":"a\\ud800"}'
+    )
+
+
+def test_screenshots_are_sent_as_captured_by_default(tmp_path: Path) -> None:
+    path = tmp_path / "step.png"
+    png = _write_png(path)
+
+    data, mime_type = asyncio.run(_runtime()._load_screenshot_bytes(str(path)))
+
+    assert (data, mime_type) == (png, "image/png")
+
+
+@pytest.mark.skipif(not _WEBP_SUPPORTED, reason="Pillow built without WebP support")
+def test_screenshots_are_reencoded_as_webp_when_enabled(tmp_path: Path) -> None:
+    path = tmp_path / "step.png"
+    png = _write_png(path)
+
+    data, mime_type = asyncio.run(_runtime(compress_screenshots=True)._load_screenshot_bytes(str(path)))
+
+    assert mime_type == "image/webp"
+    assert data[8:12] == b"WEBP"
+    assert len(data) < len(png)
+
+
+def test_screenshot_compression_keeps_bytes_it_cannot_decode(tmp_path: Path) -> None:
+    path = tmp_path / "step.png"
+    path.write_bytes(b"not an image")
+
+    data, mime_type = asyncio.run(_runtime(compress_screenshots=True)._load_screenshot_bytes(str(path)))
+
+    assert (data, mime_type) == (b"not an image", "image/png")
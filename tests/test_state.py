@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+from collections.abc import Iterator
+from pathlib import Path
+
+import orjson
+import pytest
+
+from qasimodo_agent import state as agent_state
+
+
+@pytest.fixture
+def state_file(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Iterator[Path]:
+    state_dir = tmp_path / ".qasimodo-agent"
+    path = state_dir / "agents.json"
+    monkeypatch.setattr(agent_state, "STATE_DIR", state_dir)
+    monkeypatch.setattr(agent_state, "STATE_FILE", path)
+    monkeypatch.setattr(agent_state, "_STATE_FILE_PATH", str(path))
+    agent_state._invalidate_state_cache()
+    yield path
+    agent_state._invalidate_state_cache()
+
+
+def _count_reads(monkeypatch: pytest.MonkeyPatch) -> list[int]:
+    reads: list[int] = []
+    read_state = agent_state._read_state
+
+    def counting_read_state() -> agent_state.AgentState:
+        reads.append(1)
+        return read_state()
+
+    monkeypatch.setattr(agent_state, "_read_state", counting_read_state)
+    return reads
+
+
+def test_load_state_reuses_cached_parse(state_file: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    agent_state.save_core_token("agent-123", "token-abc")
+    agent_state._invalidate_state_cache()
+    reads = _count_reads(monkeypatch)
+
+    assert agent_state.get_core_token("agent-123") == "token-abc"
+    assert agent_state.get_core_token("agent-123") == "token-abc"
+    assert len(reads) == 1
+
+    agent_state._invalidate_state_cache()
+    assert agent_state.get_core_token("agent-123") == "token-abc"
+    assert len(reads) == 2
+
+
+def test_load_state_sees_external_edit(state_file: Path) -> None:
+    agent_state.save_core_token("agent-123", "token-abc")
+    assert agent_state.get_core_token("agent-123") == "token-abc"
+
+    payload = {"agents": {}, "version": None, "core_tokens": {"agent-123": {"token": "token-rotated"}}}
+    state_file.write_bytes(orjson.dumps(payload))
+
+    assert agent_state.get_core_token("agent-123") == "token-rotated"
+
+
+def test_load_state_returns_isolated_copy(state_file: Path) -> None:
+    agent_state.remember_project_agent("proj-789", "agent-123")
+    agent_state.save_core_token("agent-123", "token-abc", "2030-01-01T00:00:00+00:00")
+
+    loaded = agent_state._load_state()
+    loaded.agents["proj-789"] = "agent-other"
+    loaded.core_tokens["agent-123"]["token"] = "token-mutated"
+
+    reloaded = agent_state._load_state()
+    assert reloaded.agents["proj-789"] == "agent-123"
+    assert reloaded.core_tokens["agent-123"]["token"] == "token-abc"
+
+
+def test_save_state_skips_unchanged_state(state_file: Path) -> None:
+    agent_state.remember_project_agent("proj-789", "agent-123")
+    before = state_file.stat()
+
+    agent_state._save_state(agent_state._load_state())
+    agent_state.remember_project_agent("proj-789", "agent-123")
+
+    after = state_file.stat()
+    assert (after.st_ino, after.st_mtime_ns) == (before.st_ino, before.st_mtime_ns)
+
+
+def test_save_state_writes_private_file_without_leftovers(state_file: Path) -> None:
+    agent_state.save_core_token("agent-123", "token-abc")
+    agent_state.save_core_token("agent-123", "token-def")
+
+    assert state_file.stat().st_mode & 0o777 == 0o600
+    assert [path.name for path in state_file.parent.iterdir()] == ["agents.json"]
+
+
+def test_save_state_removes_temp_file_on_failure(state_file: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    agent_state.save_core_token("agent-123", "token-abc")
+
+    def failing_replace(src: str, dst: object) -> None:
+        raise OSError("disk full")
+
+    monkeypatch.setattr(agent_state.os, "replace", failing_replace)
+    with pytest.raises(OSError):
+        agent_state.save_core_token("agent-123", "token-def")
+
+    assert [path.name for path in state_file.parent.iterdir()] == ["agents.json"]
+    assert agent_state.get_core_token("agent-123") == "token-abc"